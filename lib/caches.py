@@ -91,6 +91,53 @@ class ExpiringCache:
         )
         return (f'<{__class__.__name__} "{name}" at {address}, {length} item{"s" if length != 1 else ""} (maxlen={maxlen} timeout={timeout})>')
 
+class StripedExpiringCache:
+    ''' An ExpiringCache split into `shards' independent ExpiringCaches, with
+    keys assigned to a shard by hash.
+
+    Like ExpiringCache this class takes no locks. Use it for very large caches
+    that are shared between threads: each shard's dict is `shards' times
+    smaller, so the copy-and-scan the cache manager does when expiring items
+    holds the GIL for a fraction of the time it would for one big dict.
+
+    Caveats: each shard expires its own items, so LRU order is only
+    approximate across the whole cache (an item may be flushed from a full
+    shard while older items survive in others). Also each shard is
+    registered with the cache manager separately, so an overflowing cache
+    may log one "flushed N items" line per shard per tick.
+
+    `shards' must be a power of 2. '''
+    def __init__(self, *, shards=16, maxlen=10000, name="An Unnamed Cache", timeout=None):
+        assert shards > 0 and (shards & (shards - 1)) == 0, "shards must be a power of 2"
+        self.name = name
+        self.maxlen = maxlen
+        self.mask = shards - 1
+        self.shards = tuple(ExpiringCache(maxlen=max(1, maxlen // shards), name=f"{name}/{i}", timeout=timeout)
+                            for i in range(shards))
+    def _shard(self, key):
+        return self.shards[hash(key) & self.mask]
+    def get(self, key, default=None):
+        return self._shard(key).get(key, default)
+    def put(self, key, value):
+        self._shard(key).put(key, value)
+    def size_bytes(self):
+        ''' Returns the memory usage in bytes of all shards combined. '''
+        return sum(c.size_bytes() for c in self.shards)
+    def copy_dict(self):
+        ''' Returns a merged copy of all shards' contents, in the same
+        format as ExpiringCache.copy_dict(). '''
+        d = dict()
+        for c in self.shards:
+            d.update(c.copy_dict())
+        return d
+    def __len__(self):
+        return sum(len(c) for c in self.shards)
+    def __repr__(self):
+        name, address, length, maxlen, shards = (
+            self.name, '0x{:x}'.format(id(self)), len(self), self.maxlen, len(self.shards)
+        )
+        return (f'<{__class__.__name__} "{name}" at {address}, {length} item{"s" if length != 1 else ""} (maxlen={maxlen} shards={shards})>')
+
 class _ExpiringCacheMgr(PrintError):
     '''Do not use this class directly. Instead just create ExpiringCache
     instances and that will handle the creation of this object automatically
@@ -11,11 +11,19 @@ import queue
 import traceback
 import weakref
 import collections
+import heapq
+import itertools
+import concurrent.futures
 import json
 import base64
+from binascii import a2b_base64
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .transaction import Transaction
-from .caches import ExpiringCache
+from .bitcoin import Hash
+from .util import bh2u
+from .caches import StripedExpiringCache
 
 class SlpdbErrorNoSearchData(Exception):
     pass
@@ -70,26 +78,40 @@ class GraphSearchJob:
         self.job_complete = True
         self.exit_msg = reason
 
-    def fetch_metadata(self):
+    def set_metadata(self, res):
         try:
-            res = self.metadata_query(self.root_txid, self.valjob.network.slpdb_host)
             self.total_depth = res['totalDepth']
             self.txn_count_total = res['txcount']
             self.depth_map = res['depthMap']
-        except KeyError as e:
+        except (KeyError, TypeError) as e:
             raise SlpdbErrorNoSearchData(str(e))
 
-    def metadata_query(self, txid, slpdb_host):
-        requrl = self.metadata_url([txid], slpdb_host)
+    @classmethod
+    def metadata_query_many(cls, txids, slpdb_host, session=requests):
+        """
+        Returns a dict of metadata for several root txids, keyed by txid.
+        Incomplete records (or a reply without any) are skipped, so their
+        txids are simply missing.
+        """
+        requrl = cls.metadata_url(txids, slpdb_host)
         print("[SLP Graph Search] depth search url = " + requrl, file=sys.stderr)
-        reqresult = requests.get(requrl, timeout=10)
+        reqresult = session.get(requrl, timeout=10)
         res = dict()
-        for resp in json.loads(reqresult.content.decode('utf-8'))['g']:
-            o = { 'depthMap': resp['depthMap'], 'txcount': resp['txcount'], 'totalDepth': resp['totalDepth'] }
-            res = o
+        try:
+            records = json.loads(reqresult.content)['g']
+        except (KeyError, TypeError):
+            # e.g. a transient SLPDB error reply, the jobs will be retried
+            records = []
+        for resp in records:
+            try:
+                o = { 'depthMap': resp['depthMap'], 'txcount': resp['txcount'], 'totalDepth': resp['totalDepth'] }
+                res[resp['txid']] = o
+            except KeyError:
+                continue
         return res
 
-    def metadata_url(self, txids, host):
+    @staticmethod
+    def metadata_url(txids, host):
         txids_q = []
         for txid in txids:
             txids_q.append({"graphTxn.txid": txid})
@@ -118,8 +140,11 @@ class GraphSearchJob:
 
 class SlpGraphSearchManager:
     """
-    A single thread that processes graph search requests sequentially.
+    A metadata thread that batches incoming graph search requests, and a
+    small pool of search threads that process the queued jobs concurrently.
     """
+    debug_urls = False  # If true each job's last_search_url is kept up to date (costs an extra base64 encode per query)
+
     def __init__(self, threadname="GraphSearch"):
         # holds the job history and status
         self.search_jobs = dict()
@@ -127,17 +152,58 @@ class SlpGraphSearchManager:
 
         # Create a single use queue on a new thread
         self.metadata_queue = queue.Queue()
-        self.search_queue = queue.Queue()  # TODO: make this a PriorityQueue based on dag size
+        self.search_queue = queue.PriorityQueue()  # largest DAGs first, they benefit from GS the most
+        self.search_queue_seq = itertools.count()  # FIFO tie-breaker for equal size DAGs
 
         self.threadname = threadname
-        self.metadata_thread = threading.Thread(target=self.metadata_loop, name=self.threadname+'/metadata', daemon=True)
-        self.metadata_thread.start()
-        self.search_thread = threading.Thread(target=self.search_loop, name=self.threadname+'/search', daemon=True)
-        self.search_thread.start()
+
+        # large txid frontiers are split into batches that are queried concurrently
+        self.query_fanout = 8
+        self.query_fanout_min_batch = 100  # min txids per batch, smaller frontiers aren't worth the ancestor overlap
+        self.query_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.query_fanout, thread_name_prefix=self.threadname+'/query')
+
+        # each thread gets its own requests.Session (they aren't guaranteed
+        # to be thread-safe) with keep-alive connections, see get_session()
+        self.sessions = threading.local()
+
+        # metadata for pending jobs is fetched in batches
+        self.metadata_batch_size = 50
+        self.metadata_batch_window = 0.1  # seconds
+
+        # heap of (wake time, seq, job) for jobs waiting to retry metadata, only touched by the metadata thread
+        self.metadata_delayed = []
+        self.metadata_delayed_seq = itertools.count()
+        self.metadata_retry_delay = 10  # seconds
+
+        # max number of previously downloaded txids to exclude server-side per query
+        self.query_exclude_limit = 1000
+
+        # search jobs are network-bound, so several can run at once
+        self.search_thread_count = 4
 
         # dag size threshold to auto-cancel job
         self.cancel_thresh_txcount = 20
 
+        self.metadata_thread = threading.Thread(target=self.metadata_loop, name=self.threadname+'/metadata', daemon=True)
+        self.metadata_thread.start()
+        self.search_threads = [threading.Thread(target=self.search_loop, name=self.threadname+'/search/'+str(i), daemon=True) for i in range(self.search_thread_count)]
+        for t in self.search_threads:
+            t.start()
+
+    def get_session(self):
+        """
+        Returns the calling thread's requests.Session, creating it on first use.
+        requests' default Accept-Encoding already asks for compressed responses.
+        """
+        session = getattr(self.sessions, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=Retry(total=3, backoff_factor=0.3))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self.sessions.session = session
+        return session
+
     def new_search(self, valjob_ref):
         """ 
         Starts a new thread to fetch GS metadata for a job. 
@@ -163,56 +229,106 @@ class SlpGraphSearchManager:
         else:
             callback(job)
 
+    def metadata_batch(self):
+        """
+        Returns any delayed retry jobs that are due, otherwise blocks until
+        either one is due or a new job arrives. New jobs are then drained up
+        to `metadata_batch_size` or until `metadata_batch_window` seconds pass.
+        """
+        jobs = self.pop_delayed()
+        if not jobs:
+            timeout = max(0, self.metadata_delayed[0][0] - time.monotonic()) if self.metadata_delayed else None
+            try:
+                jobs.append(self.metadata_queue.get(timeout=timeout))
+            except queue.Empty:
+                return self.pop_delayed()
+        deadline = time.monotonic() + self.metadata_batch_window
+        while len(jobs) < self.metadata_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self.metadata_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+    def pop_delayed(self):
+        """ Pops the delayed retry jobs whose wake time has passed. """
+        jobs = []
+        now = time.monotonic()
+        while self.metadata_delayed and self.metadata_delayed[0][0] <= now:
+            jobs.append(heapq.heappop(self.metadata_delayed)[2])
+        return jobs
+
     def metadata_loop(self):
         while True:
-            job = self.metadata_queue.get(block=True)
-            if job.root_txid not in self.search_jobs.keys():
-                self.search_jobs[job.root_txid] = job
-            else:
-                continue
-            try:
-                if not job.valjob.running and not job.valjob.has_never_run:
-                    job.set_failed('validation finished')
-                    continue
-                if not job.valjob.network.slpdb_host:
-                    job.set_failed('SLPDB host not set')
-                    continue
-                job.fetch_metadata()
-            except SlpdbErrorNoSearchData as e:
-                if job.fetch_retries > 10:
-                    job.set_failed("No data found, right-click to try")
-                    continue
-                if self.metadata_queue.empty():
-                    time.sleep(10)  # Want to this time delay for when a brand new SLP txn comes in, gives SLPDB time to catch-up
-                job.fetch_retries += 1
-                self.metadata_queue.put(job)
-                continue
-            except Exception as e:
-                print("error in graph search query", str(e), file=sys.stderr)
-                job.set_failed(str(e))
-                continue
-            else:
-                if not job.txn_count_total and job.txn_count_total != 0:
-                    job.set_failed('metadata error')
-                    continue
-                if job.txn_count_total <= self.cancel_thresh_txcount:
-                    job.set_failed('low txn count')
+            jobs_by_host = collections.defaultdict(list)
+            for job in self.metadata_batch():
+                try:
+                    with self.lock:
+                        existing = self.search_jobs.setdefault(job.root_txid, job)
+                    if existing is not job:
+                        continue
+                    if job.waiting_to_cancel:
+                        job._cancel()
+                        continue
+                    if not job.valjob.running and not job.valjob.has_never_run:
+                        job.set_failed('validation finished')
+                        continue
+                    if not job.valjob.network.slpdb_host:
+                        job.set_failed('SLPDB host not set')
+                        continue
+                    jobs_by_host[job.valjob.network.slpdb_host].append(job)
+                except Exception as e:
+                    print("error in graph search query", str(e), file=sys.stderr)
+                    job.set_failed(str(e))
+
+            for host, jobs in jobs_by_host.items():
+                try:
+                    res = GraphSearchJob.metadata_query_many([job.root_txid for job in jobs], host, self.get_session())
+                except Exception as e:
+                    print("error in graph search query", str(e), file=sys.stderr)
+                    for job in jobs:
+                        job.set_failed(str(e))
                     continue
-                self.search_queue.put(job)
-                continue
-                # TODO We need to add a priority parameter for the search jobs queue based on:
-                #     - sort queue by DAG size, largest jobs will benefit from GS the most.
+                for job in jobs:
+                    try:
+                        self.metadata_dispatch(job, res.get(job.root_txid))
+                    except Exception as e:
+                        print("error in graph search query", str(e), file=sys.stderr)
+                        job.set_failed(str(e))
+
+    def metadata_dispatch(self, job, res):
+        """ Queues the job for search, or for a metadata retry if there was no data. """
+        try:
+            job.set_metadata(res)
+        except SlpdbErrorNoSearchData as e:
+            if job.fetch_retries > 10:
+                job.set_failed("No data found, right-click to try")
+                return
+            job.fetch_retries += 1
+            # Want to this time delay for when a brand new SLP txn comes in, gives SLPDB time to catch-up
+            heapq.heappush(self.metadata_delayed, (time.monotonic() + self.metadata_retry_delay, next(self.metadata_delayed_seq), job))
+            return
+        if not job.txn_count_total and job.txn_count_total != 0:
+            job.set_failed('metadata error')
+            return
+        if job.txn_count_total <= self.cancel_thresh_txcount:
+            job.set_failed('low txn count')
+            return
+        self.search_queue.put((-job.txn_count_total, next(self.search_queue_seq), job))
 
     def search_loop(self,):
         try:
             while True:
-                job = self.search_queue.get(block=True)
+                _, _, job = self.search_queue.get(block=True)
                 job.search_started = True
                 if not job.valjob.running and not job.valjob.has_never_run:
                     job.set_failed('validation finished')
                     continue
                 try:
-                    # search_query is a recursive call, most time will be spent here
+                    # most time will be spent here waiting on the network
                     self.search_query(job)
                 except Exception as e:
                     print("error in graph search query", e, file=sys.stderr)
@@ -220,48 +336,205 @@ class SlpGraphSearchManager:
         finally:
             print("[Graph Search] Error: SearchGraph mainloop exited.", file=sys.stderr)
 
-    def search_query(self, job, txids=None, depth_map_index=0):
-        if job.waiting_to_cancel:
-            job._cancel()
-            return
-        if not job.valjob.running and not job.valjob.has_never_run:
-            job.set_failed('validation finished')
-            return
-        if depth_map_index == 0:
-            txids = [job.root_txid]
-        job.depth_current_query, txn_count = job.depth_map[str((depth_map_index+1)*1000)]  # currently, we query for chunks with up to 1000 txns
-        if depth_map_index > 0:
-            query_depth = job.depth_current_query - job.depth_map[str((depth_map_index)*1000)][0]
-            txn_count = txn_count - job.depth_map[str((depth_map_index)*1000)][1]
-        else:
-            query_depth = job.depth_current_query
-        query_json = self.get_query_json(txids, query_depth, job.valjob.network.slpdb_host) #TODO: handle 'validity_cache' exclusion from graph search (NOTE: this will impact total dl count)
-        job.last_search_url = job.valjob.network.slpdb_host + "/q/" + base64.b64encode(json.dumps(query_json).encode('utf-8')).decode('utf-8')
-        reqresult = requests.post(job.valjob.network.slpdb_host + "/q/", json=query_json, timeout=60)
-        depends_on = []
-        depths = []
-        for resp in json.loads(reqresult.content.decode('utf-8'))['g']:
-            depends_on.extend(resp['dependsOn'])
-            depths.extend(resp['depths'])
-        txns = [(d, Transaction(base64.b64decode(tx).hex())) for d, tx in zip(depths, depends_on)]
-        job.txn_count_progress += len(txns)
-        for tx in txns:
-            SlpGraphSearchManager.tx_cache_put(tx[1])
-        if txns:
-            job.depth_completed = job.depth_map[str((depth_map_index+1)*1000)][0]
-        if job.depth_completed < job.total_depth:
-            txids = [tx[1].txid_fast() for tx in txns if tx[0] == query_depth]
+    def search_query(self, job):
+        depth_map = job.depth_map
+        total_depth = job.total_depth
+        validity_cache = job.valjob.validitycache
+        txids = [job.root_txid]
+        prev_txids = []
+        fetched = set()  # txids downloaded so far, used to filter out duplicate results
+        depth_map_index = 0
+        while True:
+            if job.waiting_to_cancel:
+                job._cancel()
+                return
+            if not job.valjob.running and not job.valjob.has_never_run:
+                job.set_failed('validation finished')
+                return
+            job.depth_current_query, txn_count = depth_map[str((depth_map_index+1)*1000)]  # currently, we query for chunks with up to 1000 txns
+            if depth_map_index > 0:
+                query_depth = job.depth_current_query - depth_map[str((depth_map_index)*1000)][0]
+                txn_count = txn_count - depth_map[str((depth_map_index)*1000)][1]
+            else:
+                query_depth = job.depth_current_query
+            # The previous chunk's txns are the ones this walk is most likely to
+            # run into again, so let SLPDB prune them. Older duplicates are
+            # filtered out below instead.
+            txns = self.search_query_batched(job, txids, query_depth, prev_txids[:self.query_exclude_limit])
+            if txns is None:
+                job._cancel()
+                return
+            if not txns:
+                job.set_failed('incomplete search results')
+                return
+            job.depth_completed = depth_map[str((depth_map_index+1)*1000)][0]
+            new_txns = [tx for tx in txns if tx[2] not in fetched]
+            job.txn_count_progress += len(new_txns)
+            for tx in new_txns:
+                if SlpGraphSearchManager._fetched_tx_cache.get(tx[2]) is None:  # e.g. already downloaded before a restart
+                    SlpGraphSearchManager.tx_cache_put(tx[1], txid=tx[2])
+            fetched.update(tx[2] for tx in new_txns)
+            prev_txids = [tx[2] for tx in txns if tx[0] != query_depth or tx[2] in validity_cache]  # i.e. not in the next frontier
+            if job.depth_completed >= total_depth:
+                break
+            # An empty frontier means the walk ran out of ancestors (each
+            # chunk's maxDepth overshoots the depth_map boundary by a level),
+            # or the remaining ones are already validated; either way we're done.
+            txids = [tx[2] for tx in txns if tx[0] == query_depth and tx[2] not in validity_cache]
+            if not txids:
+                break
             depth_map_index += 1
-            self.search_query(job, txids, depth_map_index)
-        else:
-            job.set_success()
-            print("[SLP Graph Search] job success")
+        job.set_success()
+        print("[SLP Graph Search] job success")
+
+    def search_query_batched(self, job, txids, query_depth, known_txids):
+        """
+        Splits a large txid frontier into up to `query_fanout` batches which
+        are queried concurrently. Every batch excludes the whole frontier, but
+        batches may still share ancestors, so small frontiers are not split.
+
+        Returns a list of (depth, Transaction, txid) tuples with duplicates
+        removed, or None if the job was canceled while waiting.
+        """
+        host = job.valjob.network.slpdb_host
+        exclude_txids = txids + known_txids
+        n = max(1, min(self.query_fanout, len(txids) // self.query_fanout_min_batch))
+        batches = [txids[i::n] for i in range(n)]
+        futures = [self.query_pool.submit(self.search_query_post, job, batch, query_depth, host, exclude_txids) for batch in batches]
+        pending = set(futures)
+        while pending:
+            if job.waiting_to_cancel:
+                for future in pending:
+                    future.cancel()
+                return None
+            _, pending = concurrent.futures.wait(pending, timeout=1)
+        # a txid reached by several batches keeps its shallowest depth, so it
+        # only ends up in the next frontier if no batch reached it earlier
+        txns = dict()
+        for future in futures:
+            for tx in future.result():
+                prev = txns.get(tx[2])
+                if prev is None or tx[0] < prev[0]:
+                    txns[tx[2]] = tx
+        return list(txns.values())
+
+    def search_query_post(self, job, txids, query_depth, host, exclude_txids):
+        query_json = self.get_query_json(txids, query_depth, host, exclude_txids)
+        body = json.dumps(query_json).encode('utf-8')
+        if self.debug_urls:
+            job.last_search_url = host + "/q/" + base64.b64encode(body).decode('utf-8')
+        reqresult = self.get_session().post(host + "/q/", data=body, headers={'Content-Type': 'application/json'}, timeout=60)
+        chunks = json.loads(reqresult.content)['g']
+        depends_on = itertools.chain.from_iterable(resp['dependsOn'] for resp in chunks)
+        depths = itertools.chain.from_iterable(resp['depths'] for resp in chunks)
+        # decoding here on the pool thread overlaps it with the other requests still in-flight
+        return self.decode_batch(depths, depends_on)
+
+    @staticmethod
+    def decode_batch(depths, depends_on):
+        """ Returns a list of (depth, Transaction, txid) tuples for base64 encoded raw txns. """
+        txns = []
+        for d, tx in zip(depths, depends_on):
+            raw = a2b_base64(tx)
+            txns.append((d, Transaction(raw.hex()), bh2u(Hash(raw)[::-1])))  # txid straight from the raw bytes
+        return txns
+
+    # The aggregation stages after $graphLookup do not depend on the query
+    # arguments, so they are built once and shared by every query.
+    _query_pipeline_tail = [
+        {"$project":{
+            "_id":0,
+            "tokenId": "$tokenDetails.tokenIdHex",
+            "txid": "$graphTxn.txid",
+            "dependsOn": {
+                "$map":{
+                    "input": "$dependsOn.graphTxn.txid",
+                    "in": "$$this"
+
+                }
+            },
+            "depths": {
+                "$map":{
+                    "input": "$dependsOn.depth",
+                    "in": "$$this"
+                }
+            }
+            }
+        },
+        {"$unwind": {
+            "path": "$dependsOn", "includeArrayIndex": "depends_index"
+            }
+        },
+        {"$unwind":{
+            "path": "$depths", "includeArrayIndex": "depth_index"
+            }
+        },
+        {"$project": {
+            "tokenId": 1,
+            "txid": 1,
+            "dependsOn": 1,
+            "depths": 1,
+            "compare": {"$cmp":["$depends_index", "$depth_index"]}
+            }
+        },
+        {"$match": {
+            "compare": 0
+            }
+        },
+        {"$group": {
+            "_id":"$dependsOn",
+            "txid": {"$first": "$txid"},
+            "tokenId": {"$first": "$tokenId"},
+            "depths": {"$push": "$depths"}
+            }
+        },
+        {"$lookup": {
+            "from": "confirmed",
+            "localField": "_id",
+            "foreignField": "tx.h",
+            "as": "tx"
+            }
+        },
+        {"$project": {
+            "txid": 1,
+            "tokenId": 1,
+            "depths": 1,
+            "dependsOn": "$tx.tx.raw",
+            "_id": 0
+            }
+        },
+        {
+            "$unwind": "$dependsOn"
+        },
+        {
+            "$unwind": "$depths"
+        },
+        {
+            "$sort": {"depths": 1}
+        },
+        {
+            "$group": {
+                "_id": "$txid",
+                "dependsOn": {"$push": "$dependsOn"},
+                "depths": {"$push": "$depths"},
+                "tokenId": {"$first": "$tokenId"}
+            }
+        },
+        {
+            "$project": {
+                "txid": "$_id",
+                "tokenId": 1,
+                "dependsOn": 1,
+                "depths": 1,
+                "_id": 0,
+                "txcount": { "$size": "$dependsOn" }
+            }
+        }
+    ]
 
-    def get_query_json(self, txids, max_depth, host, validity_cache=[]):
+    def get_query_json(self, txids, max_depth, host, exclude_txids=None):
         print("[SLP Graph Search] " + str(txids))
-        txids_q = []
-        for txid in txids:
-            txids_q.append({"graphTxn.txid": txid})
+        txids_q = [{"graphTxn.txid": txid} for txid in txids]
         q = {
             "v": 3,
             "q": {
@@ -277,96 +550,9 @@ class SlpGraphSearchManager:
                         "maxDepth": max_depth,
                         "depthField": "depth",
                         "restrictSearchWithMatch": { #TODO: add tokenId restriction to this for NFT1 application
-                            "graphTxn.txid": {"$nin": txids }} #validity_cache}}  # TODO: add validity_cache here also
+                            "graphTxn.txid": {"$nin": txids if exclude_txids is None else exclude_txids }}
                     }},
-                    {"$project":{
-                        "_id":0,
-                        "tokenId": "$tokenDetails.tokenIdHex",
-                        "txid": "$graphTxn.txid",
-                        "dependsOn": {
-                            "$map":{
-                                "input": "$dependsOn.graphTxn.txid",
-                                "in": "$$this"
-
-                            }
-                        },
-                        "depths": {
-                            "$map":{
-                                "input": "$dependsOn.depth",
-                                "in": "$$this"
-                            }
-                        }
-                        }
-                    },
-                    {"$unwind": {
-                        "path": "$dependsOn", "includeArrayIndex": "depends_index"
-                        }
-                    },
-                    {"$unwind":{
-                        "path": "$depths", "includeArrayIndex": "depth_index"
-                        }
-                    },
-                    {"$project": {
-                        "tokenId": 1,
-                        "txid": 1,
-                        "dependsOn": 1,
-                        "depths": 1,
-                        "compare": {"$cmp":["$depends_index", "$depth_index"]}
-                        }
-                    },
-                    {"$match": {
-                        "compare": 0
-                        }
-                    },
-                    {"$group": {
-                        "_id":"$dependsOn",
-                        "txid": {"$first": "$txid"},
-                        "tokenId": {"$first": "$tokenId"},
-                        "depths": {"$push": "$depths"}
-                        }
-                    },
-                    {"$lookup": {
-                        "from": "confirmed",
-                        "localField": "_id",
-                        "foreignField": "tx.h",
-                        "as": "tx"
-                        }
-                    },
-                    {"$project": {
-                        "txid": 1,
-                        "tokenId": 1,
-                        "depths": 1,
-                        "dependsOn": "$tx.tx.raw",
-                        "_id": 0
-                        }
-                    },
-                    {
-                        "$unwind": "$dependsOn"
-                    },
-                    {
-                        "$unwind": "$depths"
-                    },
-                    {
-                        "$sort": {"depths": 1}
-                    },
-                    {
-                        "$group": {
-                            "_id": "$txid",
-                            "dependsOn": {"$push": "$dependsOn"},
-                            "depths": {"$push": "$depths"},
-                            "tokenId": {"$first": "$tokenId"}
-                        }
-                    },
-                    {
-                        "$project": {
-                            "txid": "$_id",
-                            "tokenId": 1,
-                            "dependsOn": 1,
-                            "depths": 1,
-                            "_id": 0,
-                            "txcount": { "$size": "$dependsOn" }
-                        }
-                    }
+                    *self._query_pipeline_tail
                 ],
                 "limit": len(txids)  # we will get a maximum of len(txids) results in form of the final $projection
             }
@@ -380,14 +566,17 @@ class SlpGraphSearchManager:
     # memory consumption and UX.
     #
     # In even aggressive/pathological cases this cache won't ever exceed
-    # 100MB even when full. [see ExpiringCache.size_bytes() to test it].
+    # 100MB even when full. [see StripedExpiringCache.size_bytes() to test it].
     # This is acceptable considering this is Python + Qt and it eats memory
     # anyway.. and also this is 2019 ;). Note that all tx's in this cache
     # are in the non-deserialized state (hex encoded bytes only) as a memory
     # savings optimization.  Please maintain that invariant if you modify this
     # code, otherwise the cache may grow to 10x memory consumption if you
     # put deserialized tx's in here.
-    _fetched_tx_cache = ExpiringCache(maxlen=100000, name="GraphSearchTxnFetchCache")
+    #
+    # The cache is striped into shards since it is shared by all of the
+    # search worker threads.
+    _fetched_tx_cache = StripedExpiringCache(shards=16, maxlen=100000, name="GraphSearchTxnFetchCache")
 
     @classmethod
     def tx_cache_get(cls, txid : str) -> object:
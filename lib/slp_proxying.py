@@ -52,7 +52,7 @@ class ProxyQuerier:
                 # query just the keys we don't yet know
                 #known = txids.intersection(self.pastresults.keys())
                 #unk = txids.difference(known)
-                unk = txids.difference(self.pastresults.keys())
+                unk = txids.difference(self.pastresults)
 
                 try:
                     qresults = self.query(unk)
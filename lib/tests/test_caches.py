@@ -0,0 +1,42 @@
+import unittest
+from ..caches import StripedExpiringCache
+
+class TestStripedExpiringCache(unittest.TestCase):
+
+    def test_get_put(self):
+        c = StripedExpiringCache(shards=4, maxlen=100, name="TestCache")
+        for i in range(50):
+            c.put(str(i), i)
+        self.assertEqual(7, c.get('7'))
+        self.assertEqual(49, c.get('49'))
+        self.assertIsNone(c.get('not here'))
+        self.assertEqual('default', c.get('not here', 'default'))
+
+    def test_put_overwrites(self):
+        c = StripedExpiringCache(shards=4, maxlen=100, name="TestCache")
+        c.put('a', 1)
+        c.put('a', 2)
+        self.assertEqual(2, c.get('a'))
+        self.assertEqual(1, len(c))
+
+    def test_len_and_copy_dict(self):
+        c = StripedExpiringCache(shards=8, maxlen=1000, name="TestCache")
+        for i in range(100):
+            c.put(i, str(i))
+        self.assertEqual(100, len(c))
+        d = c.copy_dict()
+        self.assertEqual(set(range(100)), set(d.keys()))
+        self.assertEqual('42', d[42][1])
+
+    def test_shard_maxlen(self):
+        c = StripedExpiringCache(shards=16, maxlen=1600, name="TestCache")
+        self.assertEqual(16, len(c.shards))
+        for shard in c.shards:
+            self.assertEqual(100, shard.maxlen)
+
+    def test_shards_must_be_power_of_2(self):
+        for shards in (0, 3, 6, 12):
+            with self.assertRaises(AssertionError):
+                StripedExpiringCache(shards=shards)
+        StripedExpiringCache(shards=1)
+        StripedExpiringCache(shards=32)
@@ -0,0 +1,294 @@
+import base64
+import json
+import queue
+import threading
+import time
+import types
+import unittest
+
+from ..bitcoin import Hash
+from ..util import bh2u
+from ..slp_graph_search import SlpGraphSearchManager, GraphSearchJob
+
+HOST = 'https://slpdb.test'
+
+
+class FakeResponse:
+    def __init__(self, obj):
+        self.content = json.dumps(obj).encode('utf-8')
+
+
+class FakeSlpdb:
+    """ Stands in for a requests.Session talking to SLPDB. Implements just
+    enough of the metadata and $graphLookup queries for graph search. """
+
+    def __init__(self, prefix):
+        self.prefix = prefix  # keeps raw txns unique across tests, the tx cache is shared
+        self.parents = dict()
+        self.raws = dict()
+        self.txids = dict()
+        self.metadata = dict()
+        self.posts = []
+        self.gets = []
+        self.lock = threading.Lock()
+        self.post_hook = None
+
+    def add(self, name, parents=()):
+        raw = (self.prefix + '/' + name).encode('utf-8')
+        txid = bh2u(Hash(raw)[::-1])
+        self.raws[txid] = raw
+        self.txids[name] = txid
+        self.parents[txid] = [self.txids[p] for p in parents]
+        return txid
+
+    def get(self, url, timeout=None):
+        q = json.loads(base64.b64decode(url[len(HOST + "/q/"):]).decode('utf-8'))
+        txids = [o['graphTxn.txid'] for o in q['q']['aggregate'][0]['$match']['$or']]
+        with self.lock:
+            self.gets.append(txids)
+            reply = self.metadata.get('reply')
+            if reply is not None:
+                self.metadata['reply'] = None
+                return FakeResponse(reply)
+            g = [dict(self.metadata[txid], txid=txid) for txid in txids if txid in self.metadata]
+        return FakeResponse({'g': g})
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        q = json.loads(data.decode('utf-8'))['q']['aggregate']
+        starts = [o['graphTxn.txid'] for o in q[0]['$match']['$or']]
+        lookup = q[1]['$graphLookup']
+        nin = set(lookup['restrictSearchWithMatch']['graphTxn.txid']['$nin'])
+        with self.lock:
+            self.posts.append(starts)
+        if self.post_hook:
+            self.post_hook()
+        g = []
+        for start in starts:
+            # breadth-first, so each txn gets its shortest depth, and $nin txns are not walked past
+            depths = dict()
+            level, d = [p for p in self.parents[start] if p not in nin], 0
+            while level and d <= lookup['maxDepth']:
+                nxt = []
+                for txid in level:
+                    if txid in depths:
+                        continue
+                    depths[txid] = d
+                    nxt.extend(p for p in self.parents[txid] if p not in nin)
+                level, d = nxt, d + 1
+            if depths:
+                items = sorted(depths.items(), key=lambda kv: kv[1])
+                g.append({'txid': start,
+                          'dependsOn': [base64.b64encode(self.raws[t]).decode('ascii') for t, _ in items],
+                          'depths': [d for _, d in items]})
+        return FakeResponse({'g': g})
+
+
+class FakeValJob:
+    def __init__(self, root_txid, validitycache=None):
+        self.root_txid = root_txid
+        self.running = True
+        self.has_never_run = True
+        self.network = types.SimpleNamespace(slpdb_host=HOST)
+        self.validitycache = dict() if validitycache is None else validitycache
+
+
+def make_manager(slpdb):
+    mgr = SlpGraphSearchManager(threadname="TestGraphSearch")
+    mgr.get_session = lambda: slpdb
+    return mgr
+
+def make_job(root_txid, depth_map, total_depth, validitycache=None):
+    job = GraphSearchJob(root_txid, FakeValJob(root_txid, validitycache))
+    job.depth_map = {str((i+1)*1000): [d, 0] for i, d in enumerate(depth_map)}
+    job.total_depth = total_depth
+    job.txn_count_total = 1000
+    return job
+
+def make_chain(slpdb, length):
+    slpdb.add('tx%d' % length)
+    for i in reversed(range(length)):
+        slpdb.add('tx%d' % i, ['tx%d' % (i+1)])
+    return slpdb.txids['tx0']
+
+def wait_for(cond, timeout=10):
+    t0 = time.time()
+    while not cond():
+        if time.time() - t0 > timeout:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class TestSearchQuery(unittest.TestCase):
+
+    def assertAllCached(self, slpdb, txids):
+        for txid in txids:
+            self.assertIsNotNone(SlpGraphSearchManager.tx_cache_get(txid), txid)
+
+    def test_chain_across_chunks(self):
+        slpdb = FakeSlpdb('chain')
+        root = make_chain(slpdb, 30)
+        job = make_job(root, [9, 19, 29], 30)
+        make_manager(slpdb).search_query(job)
+        self.assertTrue(job.search_success)
+        self.assertEqual(3, len(slpdb.posts))
+        self.assertEqual(30, job.txn_count_progress)
+        self.assertAllCached(slpdb, [slpdb.txids['tx%d' % i] for i in range(1, 31)])
+
+    def test_walk_exhausted_before_total_depth(self):
+        # each chunk's maxDepth reaches a level past the depth_map boundary,
+        # so the last chunk's frontier can come back empty before
+        # depth_completed gets to total_depth
+        slpdb = FakeSlpdb('exhausted')
+        root = make_chain(slpdb, 12)
+        job = make_job(root, [5, 11], 12)
+        make_manager(slpdb).search_query(job)
+        self.assertTrue(job.search_success)
+        self.assertEqual(2, len(slpdb.posts))
+        self.assertLess(job.depth_completed, job.total_depth)
+        self.assertAllCached(slpdb, [slpdb.txids['tx%d' % i] for i in range(1, 13)])
+
+    def test_no_results_fails(self):
+        slpdb = FakeSlpdb('noresults')
+        root = slpdb.add('root')
+        job = make_job(root, [5], 5)
+        make_manager(slpdb).search_query(job)
+        self.assertFalse(job.search_success)
+        self.assertEqual('incomplete search results', job.exit_msg)
+
+    def test_diamond_across_chunk_boundary(self):
+        #   root -> a, b ; a -> c ; b -> c ; c -> d
+        slpdb = FakeSlpdb('diamond')
+        slpdb.add('d')
+        slpdb.add('c', ['d'])
+        slpdb.add('a', ['c'])
+        slpdb.add('b', ['c'])
+        root = slpdb.add('root', ['a', 'b'])
+        job = make_job(root, [0, 2], 3)
+        make_manager(slpdb).search_query(job)
+        self.assertTrue(job.search_success)
+        self.assertEqual(2, len(slpdb.posts))
+        self.assertEqual(sorted([slpdb.txids['a'], slpdb.txids['b']]), sorted(slpdb.posts[1]))
+        self.assertEqual(4, job.txn_count_progress)  # c is reached twice but counted once
+        self.assertAllCached(slpdb, [slpdb.txids[n] for n in 'abcd'])
+
+    def test_large_frontier_fans_out(self):
+        # root -> p0..p249 ; pi -> gi ; gi -> s
+        slpdb = FakeSlpdb('fanout')
+        slpdb.add('s')
+        for i in range(250):
+            slpdb.add('g%d' % i, ['s'])
+            slpdb.add('p%d' % i, ['g%d' % i])
+        root = slpdb.add('root', ['p%d' % i for i in range(250)])
+        job = make_job(root, [0, 2], 3)
+        make_manager(slpdb).search_query(job)
+        self.assertTrue(job.search_success)
+        self.assertEqual(3, len(slpdb.posts))  # one for the root, then the frontier split in two
+        self.assertEqual(set(slpdb.txids['p%d' % i] for i in range(250)), set(slpdb.posts[1]) | set(slpdb.posts[2]))
+        self.assertEqual(501, job.txn_count_progress)
+        self.assertAllCached(slpdb, [slpdb.txids['s']] + [slpdb.txids['g%d' % i] for i in range(250)])
+
+    def test_batched_merge_keeps_shallowest_depth(self):
+        # f0 reaches x at depth 2 (via y1, y2), f1 reaches x at depth 0
+        slpdb = FakeSlpdb('merge')
+        slpdb.add('x')
+        slpdb.add('y2', ['x'])
+        slpdb.add('y1', ['y2'])
+        slpdb.add('f0', ['y1'])
+        slpdb.add('f1', ['x'])
+        frontier = [slpdb.txids['f0'], slpdb.txids['f1']]
+        for i in range(2, 200):
+            frontier.append(slpdb.add('f%d' % i))
+        mgr = make_manager(slpdb)
+        job = make_job(slpdb.txids['f0'], [2], 2)
+        txns = mgr.search_query_batched(job, frontier, 2, [])
+        self.assertEqual(2, len(slpdb.posts))
+        depths = {txid: d for d, _, txid in txns}
+        self.assertEqual(0, depths[slpdb.txids['x']])
+        self.assertEqual(len(depths), len(txns))
+
+    def test_validated_frontier(self):
+        slpdb = FakeSlpdb('validated')
+        root = make_chain(slpdb, 30)
+        validity = {slpdb.txids['tx10']: 1}
+        job = make_job(root, [9, 19, 29], 30, validity)
+        make_manager(slpdb).search_query(job)
+        self.assertTrue(job.search_success)
+        self.assertEqual(1, len(slpdb.posts))
+        self.assertEqual(10, job.txn_count_progress)
+
+    def test_cancel_while_in_flight(self):
+        slpdb = FakeSlpdb('cancel')
+        root = make_chain(slpdb, 30)
+        release = threading.Event()
+        slpdb.post_hook = lambda: release.wait(10)
+        job = make_job(root, [9, 19, 29], 30)
+        cancelled = []
+        t = threading.Thread(target=make_manager(slpdb).search_query, args=(job,), daemon=True)
+        t.start()
+        wait_for(lambda: slpdb.posts)
+        job.sched_cancel(callback=cancelled.append)
+        t.join(5)
+        release.set()
+        self.assertFalse(t.is_alive())
+        self.assertTrue(job.job_complete)
+        self.assertFalse(job.search_success)
+        self.assertEqual([job], cancelled)
+        self.assertEqual(0, job.txn_count_progress)
+
+
+class TestMetadata(unittest.TestCase):
+
+    def test_batched_metadata_then_search(self):
+        slpdb = FakeSlpdb('metadata')
+        roots = []
+        for n in range(3):
+            slpdb.add('m%d/top' % n)
+            for i in reversed(range(30)):
+                slpdb.add('m%d/%d' % (n, i), ['m%d/%d' % (n, i+1) if i < 29 else 'm%d/top' % n])
+            root = slpdb.txids['m%d/0' % n]
+            slpdb.metadata[root] = {'depthMap': {'1000': [30, 30]}, 'txcount': 30, 'totalDepth': 30}
+            roots.append(root)
+        mgr = make_manager(slpdb)
+        mgr.metadata_batch_window = 1
+        jobs = [mgr.new_search(FakeValJob(root)) for root in roots]
+        wait_for(lambda: all(job.job_complete for job in jobs))
+        self.assertTrue(all(job.search_success for job in jobs))
+        self.assertEqual([sorted(roots)], [sorted(txids) for txids in slpdb.gets])
+        self.assertEqual(set(roots), set(mgr.search_jobs))
+
+    def test_retry_when_no_data(self):
+        slpdb = FakeSlpdb('retry')
+        root = make_chain(slpdb, 30)
+        slpdb.metadata['reply'] = {'error': 'not ready'}  # first reply has no 'g' at all
+        mgr = make_manager(slpdb)
+        mgr.metadata_retry_delay = 0.5
+        job = mgr.new_search(FakeValJob(root))
+        wait_for(lambda: len(slpdb.gets) >= 2)  # second try finds no record for root
+        self.assertFalse(job.job_complete)
+        slpdb.metadata[root] = {'depthMap': {'1000': [30, 30]}, 'txcount': 30, 'totalDepth': 30}
+        wait_for(lambda: job.job_complete)
+        self.assertTrue(job.search_success)
+        self.assertEqual(3, len(slpdb.gets))
+        self.assertEqual(2, job.fetch_retries)
+
+    def test_search_queue_largest_first(self):
+        slpdb = FakeSlpdb('priority')
+        mgr = make_manager(slpdb)
+        mgr.search_queue = q = queue.PriorityQueue()  # the search threads wait on the old queue
+        jobs = []
+        for n, size in enumerate([30, 500, 100, 500]):
+            txid = slpdb.add('q%d' % n)
+            job = GraphSearchJob(txid, FakeValJob(txid))
+            mgr.metadata_dispatch(job, {'depthMap': {}, 'txcount': size, 'totalDepth': 1})
+            jobs.append(job)
+        order = [q.get_nowait()[2] for _ in range(4)]
+        self.assertEqual([jobs[1], jobs[3], jobs[2], jobs[0]], order)
+
+    def test_low_txn_count(self):
+        slpdb = FakeSlpdb('lowcount')
+        mgr = make_manager(slpdb)
+        txid = slpdb.add('low')
+        job = GraphSearchJob(txid, FakeValJob(txid))
+        mgr.metadata_dispatch(job, {'depthMap': {}, 'txcount': 5, 'totalDepth': 1})
+        self.assertFalse(job.search_success)
+        self.assertEqual('low txn count', job.exit_msg)